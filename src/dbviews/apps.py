@@ -12,7 +12,15 @@ class DbviewsConfig(AppConfig):
         """
         from django.core.management.commands import makemigrations
 
-        from dbviews.autodetector import MigrationAutodetector
+        from dbviews.autodetector import (
+            MigrationAutodetector,
+            _materialized_view_table_set,
+            _view_table_set,
+        )
+
+        # All the models are loaded now, drop anything cached before
+        _view_table_set.cache_clear()
+        _materialized_view_table_set.cache_clear()
 
         makemigrations.MigrationAutodetector = MigrationAutodetector
         return super().ready()
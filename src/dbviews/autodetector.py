@@ -1,21 +1,34 @@
-from copy import copy
+from functools import lru_cache
 
 from django.db.migrations.autodetector import (
     MigrationAutodetector as BaseMigrationAutodetector,
 )
 from django.db.migrations.utils import resolve_relation
 
-from dbviews.operations import (
-    AlterMaterializedView,
-    AlterView,
-    CreateMaterializedView,
-    CreateView,
-    DeleteMaterializedView,
-    DeleteView,
-)
 from dbviews.views import DbMaterializedView, DbView
 from dbviews.views.fields import QueryField
 
+# Bases marking a model state as a view or materialized view
+_VIEW_BASES = frozenset({DbView, DbMaterializedView})
+
+
+@lru_cache(maxsize=1)
+def _view_table_set():
+    """
+    Return database tables of all the views
+    """
+    return frozenset(view._meta.db_table for view in DbView.get_all_subclasses())
+
+
+@lru_cache(maxsize=1)
+def _materialized_view_table_set():
+    """
+    Return database tables of all the materialized views
+    """
+    return frozenset(
+        view._meta.db_table for view in DbMaterializedView.get_all_subclasses()
+    )
+
 
 class MigrationAutodetector(BaseMigrationAutodetector):
     def _detect_changes(self, convert_apps=None, graph=None):
@@ -57,75 +70,80 @@ class MigrationAutodetector(BaseMigrationAutodetector):
         self.old_view_keys = set()
         self.new_view_keys = set()
         # Store all database view tables
-        self.db_view_tables = [
-            f"{view._meta.db_table}" for view in DbView.get_all_subclasses()
-        ]
+        self.db_view_tables = _view_table_set()
 
         # To store old and new materialized view keys
         self.old_materialized_view_keys = set()
         self.new_materialized_view_keys = set()
         # Store all database materialized view tables
-        self.db_materialized_view_tables = [
-            f"{view._meta.db_table}" for view in DbMaterializedView.get_all_subclasses()
-        ]
+        self.db_materialized_view_tables = _materialized_view_table_set()
 
         # Store from and to state model states of views and materialized views
         # and remove from model states
         self.from_state_view_states = {}
         self.to_state_view_states = {}
 
-        for (app_label, model_name), model_state in copy(
-            self.from_state.models
-        ).items():
-            db_table = (
-                model_state.options.get("db_table") or f"{app_label}_{model_name}"
-            )
-
-            if not model_state.options.get("managed", True):
-                self.old_unmanaged_keys.add((app_label, model_name))
-            elif app_label not in self.from_state.real_apps:
-                if model_state.options.get("proxy"):
-                    self.old_proxy_keys.add((app_label, model_name))
-                elif DbView in model_state.bases:
-                    self.old_view_keys.add((app_label, model_name))
-                    self.from_state_view_states[(app_label, model_name)] = (
-                        self.from_state.models.pop((app_label, model_name))
-                    )
-                elif DbMaterializedView in model_state.bases:
-                    self.old_materialized_view_keys.add((app_label, model_name))
-                    self.from_state_view_states[(app_label, model_name)] = (
-                        self.from_state.models.pop((app_label, model_name))
-                    )
+        real_apps = self.from_state.real_apps
+        # Whether the project defines any view or materialized view
+        has_views = bool(self.db_view_tables or self.db_materialized_view_tables)
+
+        for key in list(self.from_state.models):
+            app_label, model_name = key
+            model_state = self.from_state.models[key]
+            options = model_state.options
+
+            # Pick the set of keys the model belongs to
+            if not options.get("managed", True):
+                keys = self.old_unmanaged_keys
+            elif app_label in real_apps:
+                continue
+            elif options.get("proxy"):
+                keys = self.old_proxy_keys
+            elif view_bases := _VIEW_BASES.intersection(model_state.bases):
+                if DbView in view_bases:
+                    keys = self.old_view_keys
                 else:
-                    self.old_model_keys.add((app_label, model_name))
-
-        for (app_label, model_name), model_state in copy(self.to_state.models).items():
-            db_table = (
-                model_state.options.get("db_table") or f"{app_label}_{model_name}"
-            )
-
-            if not model_state.options.get("managed", True):
-                self.new_unmanaged_keys.add((app_label, model_name))
-            elif app_label not in self.from_state.real_apps or (
+                    keys = self.old_materialized_view_keys
+            else:
+                keys = self.old_model_keys
+
+            keys.add(key)
+            if keys is self.old_view_keys or keys is self.old_materialized_view_keys:
+                self.from_state_view_states[key] = model_state
+                del self.from_state.models[key]
+
+        for key in list(self.to_state.models):
+            app_label, model_name = key
+            model_state = self.to_state.models[key]
+            options = model_state.options
+
+            # Pick the set of keys the model belongs to
+            if not options.get("managed", True):
+                keys = self.new_unmanaged_keys
+            elif app_label in real_apps and not (
                 convert_apps and app_label in convert_apps
             ):
-                if model_state.options.get("proxy"):
-                    self.new_proxy_keys.add((app_label, model_name))
-                elif db_table in self.db_view_tables:
-                    self.new_view_keys.add((app_label, model_name))
-                    self.to_state_view_states[(app_label, model_name)] = (
-                        self.to_state.models.pop((app_label, model_name))
-                    )
+                continue
+            elif options.get("proxy"):
+                keys = self.new_proxy_keys
+            elif not has_views:
+                keys = self.new_model_keys
+            else:
+                db_table = options.get("db_table") or f"{app_label}_{model_name}"
+                if db_table in self.db_view_tables:
+                    keys = self.new_view_keys
                 elif db_table in self.db_materialized_view_tables:
-                    self.new_materialized_view_keys.add((app_label, model_name))
-                    self.to_state_view_states[(app_label, model_name)] = (
-                        self.to_state.models.pop((app_label, model_name))
-                    )
+                    keys = self.new_materialized_view_keys
                 else:
-                    self.new_model_keys.add((app_label, model_name))
+                    keys = self.new_model_keys
+
+            keys.add(key)
+            if keys is self.new_view_keys or keys is self.new_materialized_view_keys:
+                self.to_state_view_states[key] = model_state
+                del self.to_state.models[key]
 
-        self.from_state.resolve_fields_and_relations()
-        self.to_state.resolve_fields_and_relations()
+        self._resolve_fields_and_relations(self.from_state)
+        self._resolve_fields_and_relations(self.to_state)
 
         # Renames have to come first
         self.generate_renamed_models()
@@ -143,15 +161,18 @@ class MigrationAutodetector(BaseMigrationAutodetector):
         self.generate_altered_managers()
         self.generate_altered_db_table_comment()
 
-        # Generate views operations
-        self.generate_deleted_views()
-        self.generate_created_views()
-        self.generate_altered_views()
+        # Views removed from the project are still in the old states, so only
+        # skip views operations when neither state has any view
+        if self.from_state_view_states or self.to_state_view_states:
+            # Generate views operations
+            self.generate_deleted_views()
+            self.generate_created_views()
+            self.generate_altered_views()
 
-        # Generate materialized views operations
-        self.generate_deleted_materialized_views()
-        self.generate_created_materialized_views()
-        self.generate_altered_materialized_views()
+            # Generate materialized views operations
+            self.generate_deleted_materialized_views()
+            self.generate_created_materialized_views()
+            self.generate_altered_materialized_views()
 
         # Create the renamed fields and store them in self.renamed_fields.
         # They are used by create_altered_indexes(), generate_altered_fields(),
@@ -189,358 +210,204 @@ class MigrationAutodetector(BaseMigrationAutodetector):
 
         return self.migrations
 
-    def generate_created_views(self):
+    def _resolve_fields_and_relations(self, state):
         """
-        Find all new views and make create operations
+        Resolve fields and relations of the state unless they are already
+        resolved for the same models
+
+        NOTE: The resolved models are remembered on the state, models added
+        to or removed from `state.models` directly resolve the state again
         """
-        added_views = self.new_view_keys - self.old_view_keys
-        all_added_views = sorted(
-            added_views, key=self.swappable_first_key, reverse=True
-        )
-        for app_label, view_name in all_added_views:
-            view_state = self.to_state_view_states[app_label, view_name]
-            # Gather related fields
-            related_fields = {}
-            primary_key_rel = None
-            for field_name, field in view_state.fields.items():
-                if field.remote_field:
-                    if field.remote_field.model:
-                        if field.primary_key:
-                            primary_key_rel = field.remote_field.model
-                        elif not field.remote_field.parent_link:
-                            related_fields[field_name] = field
-                    if getattr(field.remote_field, "through", None):
-                        related_fields[field_name] = field
-
-            # Depend on the deletion of any possible proxy version of us
-            dependencies = [
-                (app_label, view_name, None, False),
-            ]
-            # Depend on all bases
-            for base in view_state.bases:
-                if isinstance(base, str) and "." in base:
-                    base_app_label, base_name = base.split(".", 1)
-                    dependencies.append((base_app_label, base_name, None, True))
-                    # Depend on the removal of base fields if the new model has
-                    # a field with the same name.
-                    old_base_view_state = self.from_state_view_states.get(
-                        (base_app_label, base_name)
-                    )
-                    new_base_view_state = self.to_state_view_states.get(
-                        (base_app_label, base_name)
-                    )
-                    if old_base_view_state and new_base_view_state:
-                        removed_base_fields = (
-                            set(old_base_view_state.fields)
-                            .difference(
-                                new_base_view_state.fields,
-                            )
-                            .intersection(view_state.fields)
+        models = frozenset(state.models)
+        if getattr(state, "_dbviews_resolved_models", None) != models:
+            state.resolve_fields_and_relations()
+            state._dbviews_resolved_models = models
+
+    def _collect_view_dependencies(self, app_label, view_name, view_state):
+        """
+        Build the dependencies and the query fields of a view or materialized
+        view operation
+        """
+        primary_key_rel = None
+        query_fields = []
+        for field_name, field in view_state.fields.items():
+            if isinstance(field, QueryField):
+                query_fields.append((field_name, field))
+                continue
+            remote_field = field.remote_field
+            if remote_field and remote_field.model and field.primary_key:
+                primary_key_rel = remote_field.model
+
+        # Depend on the deletion of any possible proxy version of us
+        dependencies = [
+            (app_label, view_name, None, False),
+        ]
+        # Depend on all bases
+        for base in view_state.bases:
+            if isinstance(base, str) and "." in base:
+                base_app_label, base_name = base.split(".", 1)
+                dependencies.append((base_app_label, base_name, None, True))
+                # Depend on the removal of base fields if the new model has
+                # a field with the same name.
+                old_base_view_state = self.from_state_view_states.get(
+                    (base_app_label, base_name)
+                )
+                new_base_view_state = self.to_state_view_states.get(
+                    (base_app_label, base_name)
+                )
+                if old_base_view_state and new_base_view_state:
+                    removed_base_fields = (
+                        old_base_view_state.fields.keys()
+                        - new_base_view_state.fields.keys()
+                    ) & view_state.fields.keys()
+                    for removed_base_field in removed_base_fields:
+                        dependencies.append(
+                            (base_app_label, base_name, removed_base_field, False)
                         )
-                        for removed_base_field in removed_base_fields:
-                            dependencies.append(
-                                (base_app_label, base_name, removed_base_field, False)
-                            )
-            # Depend on the other end of the primary key if it's a relation
-            if primary_key_rel:
-                dependencies.append(
-                    resolve_relation(
-                        primary_key_rel,
-                        app_label,
-                        view_name,
-                    )
-                    + (None, True)
+        # Depend on the other end of the primary key if it's a relation
+        if primary_key_rel:
+            dependencies.append(
+                resolve_relation(
+                    primary_key_rel,
+                    app_label,
+                    view_name,
                 )
+                + (None, True)
+            )
+        return dependencies, query_fields
+
+    def _generate_created_views(self, added_views, operation_class, base_class):
+        """
+        Make create operations of the given operation class for added views
+        """
+        # View states are popped from `to_state.models`, so they can never be
+        # swappable and the plain key order is the same as swappable_first_key
+        all_added_views = sorted(added_views, reverse=True)
+        for key in all_added_views:
+            app_label, view_name = key
+            view_state = self.to_state_view_states[key]
+            dependencies, query_fields = self._collect_view_dependencies(
+                app_label, view_name, view_state
+            )
             # Generate creation operation
             self.add_operation(
                 app_label,
-                CreateView(
+                operation_class(
                     name=view_state.name,
-                    fields=[
-                        d
-                        for d in view_state.fields.items()
-                        if isinstance(d[1], QueryField)
-                    ],
+                    fields=query_fields,
                     options=view_state.options,
-                    bases=(DbView,),
+                    bases=(base_class,),
                     managers=view_state.managers,
                 ),
                 dependencies=dependencies,
             )
 
-    def generate_deleted_views(self):
+    def _generate_deleted_views(self, deleted_views, operation_class):
         """
-        Find all deleted views make delete operations for them as well.
+        Make delete operations of the given operation class for deleted views
         """
-        deleted_views = self.old_view_keys - self.new_view_keys
         all_deleted_views = sorted(deleted_views)
-        for app_label, model_name in all_deleted_views:
-            view_state = self.from_state_view_states[app_label, model_name]
+        for key in all_deleted_views:
+            app_label = key[0]
+            view_state = self.from_state_view_states[key]
             self.add_operation(
                 app_label,
-                DeleteView(name=view_state.name),
+                operation_class(name=view_state.name),
             )
 
-    def generate_altered_views(self):
+    def _generate_altered_views(self, common_views, operation_class, base_class):
         """
-        Find all views modified by changes in view_query.
+        Make alter operations of the given operation class for views whose
+        view_query changed
         """
-        common_views = self.new_view_keys & self.old_view_keys
-        for app_label, view_name in common_views:
-            old_view_state = self.from_state_view_states[app_label, view_name]
-            new_view_state = self.to_state_view_states[app_label, view_name]
-
-            # Return when there is no change in view query
-            if (
-                old_view_state.get_field("view_query").query
-                == new_view_state.get_field("view_query").query
-            ):
-                return
-
-            # Gather related fields
-            related_fields = {}
-            primary_key_rel = None
-            for field_name, field in new_view_state.fields.items():
-                if field.remote_field:
-                    if field.remote_field.model:
-                        if field.primary_key:
-                            primary_key_rel = field.remote_field.model
-                        elif not field.remote_field.parent_link:
-                            related_fields[field_name] = field
-                    if getattr(field.remote_field, "through", None):
-                        related_fields[field_name] = field
-
-            # Depend on the deletion of any possible proxy version of us
-            dependencies = [
-                (app_label, view_name, None, False),
-            ]
-            # Depend on all bases
-            for base in new_view_state.bases:
-                if isinstance(base, str) and "." in base:
-                    base_app_label, base_name = base.split(".", 1)
-                    dependencies.append((base_app_label, base_name, None, True))
-                    # Depend on the removal of base fields if the new model has
-                    # a field with the same name.
-                    old_base_view_state = self.from_state_view_states.get(
-                        (base_app_label, base_name)
-                    )
-                    new_base_view_state = self.to_state_view_states.get(
-                        (base_app_label, base_name)
-                    )
-                    if old_base_view_state and new_base_view_state:
-                        removed_base_fields = (
-                            set(old_base_view_state.fields)
-                            .difference(
-                                new_base_view_state.fields,
-                            )
-                            .intersection(new_view_state.fields)
-                        )
-                        for removed_base_field in removed_base_fields:
-                            dependencies.append(
-                                (base_app_label, base_name, removed_base_field, False)
-                            )
-            # Depend on the other end of the primary key if it's a relation
-            if primary_key_rel:
-                dependencies.append(
-                    resolve_relation(
-                        primary_key_rel,
-                        app_label,
-                        view_name,
-                    )
-                    + (None, True)
-                )
-            # Generate creation operation
+        for key in common_views:
+            app_label, view_name = key
+            old_view_state = self.from_state_view_states[key]
+            new_view_state = self.to_state_view_states[key]
+
+            # Skip the view when there is no change in view query
+            old_view_query = old_view_state.get_field("view_query").query
+            new_view_query = new_view_state.get_field("view_query").query
+            if old_view_query == new_view_query:
+                continue
+
+            dependencies, query_fields = self._collect_view_dependencies(
+                app_label, view_name, new_view_state
+            )
+            # Generate alteration operation
             self.add_operation(
                 app_label,
-                AlterView(
+                operation_class(
                     name=new_view_state.name,
-                    fields=[
-                        d
-                        for d in new_view_state.fields.items()
-                        if isinstance(d[1], QueryField)
-                    ],
+                    fields=query_fields,
                     options=new_view_state.options,
-                    bases=(DbView,),
+                    bases=(base_class,),
                     managers=new_view_state.managers,
                 ),
                 dependencies=dependencies,
             )
 
+    def generate_created_views(self):
+        """
+        Find all new views and make create operations
+        """
+        from dbviews.operations import CreateView
+
+        self._generate_created_views(
+            self.new_view_keys - self.old_view_keys, CreateView, DbView
+        )
+
+    def generate_deleted_views(self):
+        """
+        Find all deleted views make delete operations for them as well.
+        """
+        from dbviews.operations import DeleteView
+
+        self._generate_deleted_views(
+            self.old_view_keys - self.new_view_keys, DeleteView
+        )
+
+    def generate_altered_views(self):
+        """
+        Find all views modified by changes in view_query.
+        """
+        from dbviews.operations import AlterView
+
+        self._generate_altered_views(
+            self.new_view_keys & self.old_view_keys, AlterView, DbView
+        )
+
     def generate_created_materialized_views(self):
         """
         Find all new materialized views and make create operations
         """
-        added_views = self.new_materialized_view_keys - self.old_materialized_view_keys
-        all_added_views = sorted(
-            added_views, key=self.swappable_first_key, reverse=True
+        from dbviews.operations import CreateMaterializedView
+
+        self._generate_created_views(
+            self.new_materialized_view_keys - self.old_materialized_view_keys,
+            CreateMaterializedView,
+            DbMaterializedView,
         )
-        for app_label, view_name in all_added_views:
-            view_state = self.to_state_view_states[app_label, view_name]
-            # Gather related fields
-            related_fields = {}
-            primary_key_rel = None
-            for field_name, field in view_state.fields.items():
-                if field.remote_field:
-                    if field.remote_field.model:
-                        if field.primary_key:
-                            primary_key_rel = field.remote_field.model
-                        elif not field.remote_field.parent_link:
-                            related_fields[field_name] = field
-                    if getattr(field.remote_field, "through", None):
-                        related_fields[field_name] = field
-
-            # Depend on the deletion of any possible proxy version of us
-            dependencies = [
-                (app_label, view_name, None, False),
-            ]
-            # Depend on all bases
-            for base in view_state.bases:
-                if isinstance(base, str) and "." in base:
-                    base_app_label, base_name = base.split(".", 1)
-                    dependencies.append((base_app_label, base_name, None, True))
-                    # Depend on the removal of base fields if the new model has
-                    # a field with the same name.
-                    old_base_view_state = self.from_state_view_states.get(
-                        (base_app_label, base_name)
-                    )
-                    new_base_view_state = self.to_state_view_states.get(
-                        (base_app_label, base_name)
-                    )
-                    if old_base_view_state and new_base_view_state:
-                        removed_base_fields = (
-                            set(old_base_view_state.fields)
-                            .difference(
-                                new_base_view_state.fields,
-                            )
-                            .intersection(view_state.fields)
-                        )
-                        for removed_base_field in removed_base_fields:
-                            dependencies.append(
-                                (base_app_label, base_name, removed_base_field, False)
-                            )
-            # Depend on the other end of the primary key if it's a relation
-            if primary_key_rel:
-                dependencies.append(
-                    resolve_relation(
-                        primary_key_rel,
-                        app_label,
-                        view_name,
-                    )
-                    + (None, True)
-                )
-            # Generate creation operation
-            self.add_operation(
-                app_label,
-                CreateMaterializedView(
-                    name=view_state.name,
-                    fields=[
-                        d
-                        for d in view_state.fields.items()
-                        if isinstance(d[1], QueryField)
-                    ],
-                    options=view_state.options,
-                    bases=(DbMaterializedView,),
-                    managers=view_state.managers,
-                ),
-                dependencies=dependencies,
-            )
 
     def generate_deleted_materialized_views(self):
         """
         Find all deleted materialized views make delete operations for them as well.
         """
-        deleted_views = (
-            self.old_materialized_view_keys - self.new_materialized_view_keys
+        from dbviews.operations import DeleteMaterializedView
+
+        self._generate_deleted_views(
+            self.old_materialized_view_keys - self.new_materialized_view_keys,
+            DeleteMaterializedView,
         )
-        all_deleted_views = sorted(deleted_views)
-        for app_label, model_name in all_deleted_views:
-            view_state = self.from_state_view_states[app_label, model_name]
-            self.add_operation(
-                app_label,
-                DeleteMaterializedView(name=view_state.name),
-            )
 
     def generate_altered_materialized_views(self):
         """
         Find all materialized views modified by changes in view_query.
         """
-        common_views = self.new_materialized_view_keys & self.old_materialized_view_keys
-        for app_label, view_name in common_views:
-            old_view_state = self.from_state_view_states[app_label, view_name]
-            new_view_state = self.to_state_view_states[app_label, view_name]
-
-            # Return when there is no change in view query
-            if (
-                old_view_state.get_field("view_query").query
-                == new_view_state.get_field("view_query").query
-            ):
-                return
-
-            # Gather related fields
-            related_fields = {}
-            primary_key_rel = None
-            for field_name, field in new_view_state.fields.items():
-                if field.remote_field:
-                    if field.remote_field.model:
-                        if field.primary_key:
-                            primary_key_rel = field.remote_field.model
-                        elif not field.remote_field.parent_link:
-                            related_fields[field_name] = field
-                    if getattr(field.remote_field, "through", None):
-                        related_fields[field_name] = field
-
-            # Depend on the deletion of any possible proxy version of us
-            dependencies = [
-                (app_label, view_name, None, False),
-            ]
-            # Depend on all bases
-            for base in new_view_state.bases:
-                if isinstance(base, str) and "." in base:
-                    base_app_label, base_name = base.split(".", 1)
-                    dependencies.append((base_app_label, base_name, None, True))
-                    # Depend on the removal of base fields if the new model has
-                    # a field with the same name.
-                    old_base_view_state = self.from_state_view_states.get(
-                        (base_app_label, base_name)
-                    )
-                    new_base_view_state = self.to_state_view_states.get(
-                        (base_app_label, base_name)
-                    )
-                    if old_base_view_state and new_base_view_state:
-                        removed_base_fields = (
-                            set(old_base_view_state.fields)
-                            .difference(
-                                new_base_view_state.fields,
-                            )
-                            .intersection(new_view_state.fields)
-                        )
-                        for removed_base_field in removed_base_fields:
-                            dependencies.append(
-                                (base_app_label, base_name, removed_base_field, False)
-                            )
-            # Depend on the other end of the primary key if it's a relation
-            if primary_key_rel:
-                dependencies.append(
-                    resolve_relation(
-                        primary_key_rel,
-                        app_label,
-                        view_name,
-                    )
-                    + (None, True)
-                )
-            # Generate creation operation
-            self.add_operation(
-                app_label,
-                AlterMaterializedView(
-                    name=new_view_state.name,
-                    fields=[
-                        d
-                        for d in new_view_state.fields.items()
-                        if isinstance(d[1], QueryField)
-                    ],
-                    options=new_view_state.options,
-                    bases=(DbMaterializedView,),
-                    managers=new_view_state.managers,
-                ),
-                dependencies=dependencies,
-            )
+        from dbviews.operations import AlterMaterializedView
+
+        self._generate_altered_views(
+            self.new_materialized_view_keys & self.old_materialized_view_keys,
+            AlterMaterializedView,
+            DbMaterializedView,
+        )
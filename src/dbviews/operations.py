@@ -1,13 +1,40 @@
-from django.db import migrations
+from django.db import DatabaseError, migrations, transaction
+from django.db.transaction import TransactionManagementError
 
-from dbviews.views import DbMaterializedView, DbView
+# Databases without `CREATE OR REPLACE VIEW`
+_VENDORS_WITHOUT_REPLACE_VIEW = frozenset({"sqlite"})
+
+_SQL_CREATE_VIEW = "CREATE VIEW {table} AS {query}"
+_SQL_REPLACE_VIEW = "CREATE OR REPLACE VIEW {table} AS {query}"
+_SQL_DROP_VIEW = "DROP VIEW IF EXISTS {table}"
+_SQL_CREATE_MATERIALIZED_VIEW = "CREATE MATERIALIZED VIEW {table} AS {query}"
+_SQL_DROP_MATERIALIZED_VIEW = "DROP MATERIALIZED VIEW IF EXISTS {table}"
+_SQL_RECREATE_MATERIALIZED_VIEW = (
+    f"{_SQL_DROP_MATERIALIZED_VIEW}; {_SQL_CREATE_MATERIALIZED_VIEW}"
+)
+
+
+def get_view_query(operation):
+    """
+    This function is used to get the query of `view_query` field from fields of
+    an operation
+    """
+    for name, field in operation.fields:
+        if name == "view_query":
+            return field.query
+
+    raise ValueError(
+        f"`view_query` field is required in fields of "
+        f"{operation.__class__.__name__} `{operation.name}`"
+    )
 
 
 def create_view(view, schema_editor, view_query):
     """
     This function is used to create a view in database
     """
-    view_sql = f"CREATE VIEW {view._meta.db_table} AS {view_query}"
+    table = schema_editor.quote_name(view._meta.db_table)
+    view_sql = _SQL_CREATE_VIEW.format_map({"table": table, "query": view_query})
     schema_editor.execute(view_sql)
 
 
@@ -15,7 +42,8 @@ def drop_view(view, schema_editor):
     """
     This function is used to delete a view from database
     """
-    view_sql = f"DROP VIEW IF EXISTS {view._meta.db_table}"
+    table = schema_editor.quote_name(view._meta.db_table)
+    view_sql = _SQL_DROP_VIEW.format_map({"table": table})
     schema_editor.execute(view_sql)
 
 
@@ -23,7 +51,10 @@ def create_materialized_view(view, schema_editor, view_query):
     """
     This function is used to create a materialized view in database
     """
-    view_sql = f"CREATE MATERIALIZED VIEW {view._meta.db_table} AS {view_query}"
+    table = schema_editor.quote_name(view._meta.db_table)
+    view_sql = _SQL_CREATE_MATERIALIZED_VIEW.format_map(
+        {"table": table, "query": view_query}
+    )
     schema_editor.execute(view_sql)
 
 
@@ -31,7 +62,51 @@ def drop_materialized_view(view, schema_editor):
     """
     This function is used to delete a materialized view from database
     """
-    view_sql = f"DROP MATERIALIZED VIEW IF EXISTS {view._meta.db_table}"
+    table = schema_editor.quote_name(view._meta.db_table)
+    view_sql = _SQL_DROP_MATERIALIZED_VIEW.format_map({"table": table})
+    schema_editor.execute(view_sql)
+
+
+def replace_view(view, schema_editor, view_query):
+    """
+    This function is used to replace the query of a view in database
+    """
+    connection = schema_editor.connection
+    # Recreate the view when `CREATE OR REPLACE VIEW` isn't supported, and when
+    # only collecting SQL since replacing fails if the view columns changed
+    if schema_editor.collect_sql or connection.vendor in _VENDORS_WITHOUT_REPLACE_VIEW:
+        drop_view(view, schema_editor)
+        create_view(view, schema_editor, view_query)
+        return
+
+    table = schema_editor.quote_name(view._meta.db_table)
+    view_sql = _SQL_REPLACE_VIEW.format_map({"table": table, "query": view_query})
+    # DDL can't run inside a savepoint on these databases, their
+    # `CREATE OR REPLACE VIEW` accepts changes of the view columns anyway
+    if not connection.features.can_rollback_ddl:
+        schema_editor.execute(view_sql)
+        return
+
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute(view_sql)
+    except TransactionManagementError:
+        raise
+    except DatabaseError:
+        # Columns of the view can't be changed in place, so recreate it
+        drop_view(view, schema_editor)
+        create_view(view, schema_editor, view_query)
+
+
+def recreate_materialized_view(view, schema_editor, view_query):
+    """
+    This function is used to drop and create a materialized view in database in a
+    single statement execution
+    """
+    table = schema_editor.quote_name(view._meta.db_table)
+    view_sql = _SQL_RECREATE_MATERIALIZED_VIEW.format_map(
+        {"table": table, "query": view_query}
+    )
     schema_editor.execute(view_sql)
 
 
@@ -41,8 +116,11 @@ class CreateView(migrations.CreateModel):
     """
 
     def __init__(self, name, fields, options=None, bases=None, managers=None) -> None:
+        from dbviews.views import DbView
+
         self.bases = (DbView,)
         super().__init__(name, fields, options, bases, managers)
+        self._view_query_sql = get_view_query(self)
 
     def deconstruct(self):
         output = super().deconstruct()
@@ -53,7 +131,7 @@ class CreateView(migrations.CreateModel):
         view = to_state.apps.get_model(app_label, self.name)
 
         if self.allow_migrate_model(schema_editor.connection.alias, view):
-            create_view(view, schema_editor, view._meta.get_field("view_query").query)
+            create_view(view, schema_editor, self._view_query_sql)
 
     def database_backwards(self, app_label, schema_editor, from_state, to_state):
         view = from_state.apps.get_model(app_label, self.name)
@@ -79,7 +157,7 @@ class DeleteView(migrations.DeleteModel):
     def database_backwards(self, app_label, schema_editor, from_state, to_state):
         view = to_state.apps.get_model(app_label, self.name)
         if self.allow_migrate_model(schema_editor.connection.alias, view):
-            create_view(view, schema_editor, view._meta.get_field("view_query").query)
+            create_view(view, schema_editor, view._meta.view_query_sql)
 
     def describe(self) -> str:
         return f"Delete view {self.name}"
@@ -95,8 +173,11 @@ class AlterView(migrations.CreateModel):
     """
 
     def __init__(self, name, fields, options=None, bases=None, managers=None) -> None:
+        from dbviews.views import DbView
+
         self.bases = (DbView,)
         super().__init__(name, fields, options, bases, managers)
+        self._view_query_sql = get_view_query(self)
 
     def deconstruct(self):
         output = super().deconstruct()
@@ -107,15 +188,13 @@ class AlterView(migrations.CreateModel):
         view = to_state.apps.get_model(app_label, self.name)
 
         if self.allow_migrate_model(schema_editor.connection.alias, view):
-            drop_view(view, schema_editor)
-            create_view(view, schema_editor, view._meta.get_field("view_query").query)
+            replace_view(view, schema_editor, self._view_query_sql)
 
     def database_backwards(self, app_label, schema_editor, from_state, to_state):
         view = to_state.apps.get_model(app_label, self.name)
 
         if self.allow_migrate_model(schema_editor.connection.alias, view):
-            drop_view(view, schema_editor)
-            create_view(view, schema_editor, view._meta.get_field("view_query").query)
+            replace_view(view, schema_editor, view._meta.view_query_sql)
 
     def describe(self) -> str:
         return f"Alter view {self.name}"
@@ -131,8 +210,11 @@ class CreateMaterializedView(migrations.CreateModel):
     """
 
     def __init__(self, name, fields, options=None, bases=None, managers=None) -> None:
+        from dbviews.views import DbMaterializedView
+
         self.bases = (DbMaterializedView,)
         super().__init__(name, fields, options, bases, managers)
+        self._view_query_sql = get_view_query(self)
 
     def deconstruct(self):
         output = super().deconstruct()
@@ -143,9 +225,7 @@ class CreateMaterializedView(migrations.CreateModel):
         view = to_state.apps.get_model(app_label, self.name)
 
         if self.allow_migrate_model(schema_editor.connection.alias, view):
-            create_materialized_view(
-                view, schema_editor, view._meta.get_field("view_query").query
-            )
+            create_materialized_view(view, schema_editor, self._view_query_sql)
 
     def database_backwards(self, app_label, schema_editor, from_state, to_state):
         view = from_state.apps.get_model(app_label, self.name)
@@ -171,9 +251,7 @@ class DeleteMaterializedView(migrations.DeleteModel):
     def database_backwards(self, app_label, schema_editor, from_state, to_state):
         view = to_state.apps.get_model(app_label, self.name)
         if self.allow_migrate_model(schema_editor.connection.alias, view):
-            create_materialized_view(
-                view, schema_editor, view._meta.get_field("view_query").query
-            )
+            create_materialized_view(view, schema_editor, view._meta.view_query_sql)
 
     def describe(self) -> str:
         return f"Delete materialized view {self.name}"
@@ -189,8 +267,11 @@ class AlterMaterializedView(migrations.CreateModel):
     """
 
     def __init__(self, name, fields, options=None, bases=None, managers=None) -> None:
+        from dbviews.views import DbMaterializedView
+
         self.bases = (DbMaterializedView,)
         super().__init__(name, fields, options, bases, managers)
+        self._view_query_sql = get_view_query(self)
 
     def deconstruct(self):
         output = super().deconstruct()
@@ -201,19 +282,13 @@ class AlterMaterializedView(migrations.CreateModel):
         view = to_state.apps.get_model(app_label, self.name)
 
         if self.allow_migrate_model(schema_editor.connection.alias, view):
-            drop_materialized_view(view, schema_editor)
-            create_materialized_view(
-                view, schema_editor, view._meta.get_field("view_query").query
-            )
+            recreate_materialized_view(view, schema_editor, self._view_query_sql)
 
     def database_backwards(self, app_label, schema_editor, from_state, to_state):
         view = to_state.apps.get_model(app_label, self.name)
 
         if self.allow_migrate_model(schema_editor.connection.alias, view):
-            drop_materialized_view(view, schema_editor)
-            create_materialized_view(
-                view, schema_editor, view._meta.get_field("view_query").query
-            )
+            recreate_materialized_view(view, schema_editor, view._meta.view_query_sql)
 
     def describe(self) -> str:
         return f"Alter materialized view {self.name}"
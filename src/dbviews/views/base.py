@@ -1,6 +1,6 @@
-from typing import Any
+from typing import Optional
 
-from django.db import connection, models
+from django.db import connection, models, transaction
 
 from dbviews.views.metaclasses import ViewModelMeta
 
@@ -10,10 +10,6 @@ class ViewManager(models.Manager):
     This class is used as a manager for views and materialized views.
     """
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        return queryset.defer("view_query")
-
     def bulk_create(self, *args, **kwargs):
         raise NotImplementedError
 
@@ -30,14 +26,27 @@ class ViewManager(models.Manager):
         raise NotImplementedError
 
 
+class ViewLiteManager(ViewManager):
+    """
+    This class is used as a manager for read only access of views and materialized
+    views rows as named tuples instead of model instances.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().values_list(named=True)
+
+
 class DbView(models.Model, metaclass=ViewModelMeta):
     """
     This class is utilized for creating views in database through inheritance.
     """
 
     _skip_meta_validations = True
+    # Subclasses registered by the metaclass in order of definition
+    _registered_subclasses = []
 
     objects = ViewManager()
+    lite_objects = ViewLiteManager()
 
     class Meta:
         abstract = True
@@ -52,30 +61,13 @@ class DbView(models.Model, metaclass=ViewModelMeta):
     def get_all_subclasses(cls):
         """
         This method is used to return all the subclasses including nested inherited classes
+        in order of their definition
         """
-
-        def get_subclasses(cls, subclasses):
-            new_subclasses = cls.__subclasses__()
-            if new_subclasses:
-                subclasses.update(new_subclasses)
-                for subclass in new_subclasses:
-                    get_subclasses(cls=subclass, subclasses=subclasses)
-
-        subclasses = set()
-        get_subclasses(cls, subclasses)
-        return subclasses
-
-    def __getattribute__(self, name: str) -> Any:
-        if name == "view_query":
-            raise AttributeError(
-                f"'{self.__class__.__name__}' object has no attribute '{name}'"
-            )
-        return super().__getattribute__(name)
-
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name == "view_query":
-            return
-        return super().__setattr__(name, value)
+        return tuple(
+            subclass
+            for subclass in cls._registered_subclasses
+            if subclass is not cls and issubclass(subclass, cls)
+        )
 
 
 class DbMaterializedView(models.Model, metaclass=ViewModelMeta):
@@ -84,8 +76,11 @@ class DbMaterializedView(models.Model, metaclass=ViewModelMeta):
     """
 
     _skip_meta_validations = True
+    # Subclasses registered by the metaclass in order of definition
+    _registered_subclasses = []
 
     objects = ViewManager()
+    lite_objects = ViewLiteManager()
 
     class Meta:
         abstract = True
@@ -97,38 +92,50 @@ class DbMaterializedView(models.Model, metaclass=ViewModelMeta):
         raise NotImplementedError
 
     @classmethod
-    def refresh(cls):
+    def refresh(
+        cls,
+        concurrently: bool = False,
+        with_no_data: bool = False,
+        timeout_ms: Optional[int] = None,
+    ):
         """
         This method is used to refresh the view
+
+        `concurrently` refreshes the view without locking out concurrent reads
+        of it, it requires a unique index on the view using only column names
+        and covering all the rows. `with_no_data` leaves the view in an
+        unscannable state until it is refreshed again. `timeout_ms` aborts the
+        refresh when it runs longer than the given milliseconds.
         """
-        with connection.cursor() as cursor:
-            cursor.execute(f"REFRESH MATERIALIZED VIEW {cls._meta.db_table}")
+        if concurrently and with_no_data:
+            raise ValueError(
+                "`concurrently` and `with_no_data` cannot be used together"
+            )
+
+        sql = "REFRESH MATERIALIZED VIEW "
+        if concurrently:
+            sql += "CONCURRENTLY "
+        sql += connection.ops.quote_name(cls._meta.db_table)
+        if with_no_data:
+            sql += " WITH NO DATA"
+
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            if timeout_ms:
+                # Statement timeout is limited to the transaction of the refresh
+                cursor.execute(
+                    "SELECT set_config('statement_timeout', %s, true)",
+                    [str(int(timeout_ms))],
+                )
+            cursor.execute(sql)
 
     @classmethod
     def get_all_subclasses(cls):
         """
         This method is used to return all the subclasses including nested inherited classes
+        in order of their definition
         """
-
-        def get_subclasses(cls, subclasses):
-            new_subclasses = cls.__subclasses__()
-            if new_subclasses:
-                subclasses.update(new_subclasses)
-                for subclass in new_subclasses:
-                    get_subclasses(cls=subclass, subclasses=subclasses)
-
-        subclasses = set()
-        get_subclasses(cls, subclasses)
-        return subclasses
-
-    def __getattribute__(self, name: str) -> Any:
-        if name == "view_query":
-            raise AttributeError(
-                f"'{self.__class__.__name__}' object has no attribute '{name}'"
-            )
-        return super().__getattribute__(name)
-
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name == "view_query":
-            return
-        return super().__setattr__(name, value)
+        return tuple(
+            subclass
+            for subclass in cls._registered_subclasses
+            if subclass is not cls and issubclass(subclass, cls)
+        )
@@ -8,19 +8,49 @@ if TYPE_CHECKING:
     from dbviews import views
 
 
+class QueryFieldDescriptor:
+    """
+    This descriptor is used to hide the query field from view and materialized view
+    instances
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        raise AttributeError(
+            f"'{instance.__class__.__name__}' object has no attribute "
+            f"'{self.field.attname}'"
+        )
+
+    def __set__(self, instance, value):
+        # Values assigned to the query field are ignored
+        return
+
+
 class QueryField(Field):
     """
     This field is used to store query of a particular database view or materialized view
     """
 
+    descriptor_class = QueryFieldDescriptor
+
     def __init__(self, query):
         self.query = query
         super().__init__()
 
     def deconstruct(self):
-        name, path, args, kwargs = super().deconstruct()
-        kwargs["query"] = self.query
-        return name, path, args, kwargs
+        # `query` is the only state this field accepts, so the generic
+        # field deconstruction is not needed
+        path = f"{self.__class__.__module__}.{self.__class__.__qualname__}"
+        return self.name, path, [], {"query": self.query}
+
+    def get_attname_column(self):
+        # The query has no column in the view, so the field is never selected
+        attname = self.get_attname()
+        return attname, None
 
     def to_python(self, value):
         return self.query
@@ -43,4 +73,7 @@ class QueryField(Field):
                 f"Name of field should be `view_query` instead of `{name}`"
             )
 
-        return super().contribute_to_class(cls, name, **kwargs)
+        super().contribute_to_class(cls, name, **kwargs)
+        cls._meta.view_query_sql = self.query
+        # Fields without a column don't get their descriptor set by Django
+        setattr(cls, self.attname, self.descriptor_class(self))
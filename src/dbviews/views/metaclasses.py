@@ -1,7 +1,15 @@
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
 from django.db import models
 
 from dbviews.views.fields import QueryField
 
+_VIEW_QUERY_REQUIRED_MESSAGE = (
+    "`view_query` field value is required to create a view and materialized view"
+)
+_VIEW_QUERY_TYPE_MESSAGE = "`view_query` must be instance of `QueryField`"
+_VIEW_QUERY_SQL_MESSAGE = "Provide sql query as query value in `view_query`"
+
 
 class ViewModelMeta(models.base.ModelBase):
     """
@@ -10,19 +18,31 @@ class ViewModelMeta(models.base.ModelBase):
     """
 
     def __new__(cls, name, bases, attrs, **kwargs):
-        new_class = super().__new__(cls, name, bases, attrs, **kwargs)
+        # Validate before building the model class, abstract views don't need
+        # a query as they aren't created in database
+        skip_meta_validations = attrs.get("_skip_meta_validations", False)
+        if skip_meta_validations:
+            del attrs["_skip_meta_validations"]
+
+        if not (skip_meta_validations or getattr(attrs.get("Meta"), "abstract", False)):
+            if "view_query" not in attrs:
+                raise ImproperlyConfigured(_VIEW_QUERY_REQUIRED_MESSAGE)
 
-        if attrs.pop("_skip_meta_validations", False):
-            return new_class
-        if "view_query" not in attrs:
-            raise FileNotFoundError(
-                "`view_query` field value is required to create a view and materialized view"
-            )
+            if not isinstance(attrs["view_query"], QueryField):
+                raise TypeError(_VIEW_QUERY_TYPE_MESSAGE)
 
-        if not isinstance(attrs["view_query"], QueryField):
-            raise TypeError("`view_query` must be instance of `QueryField`")
+            if not isinstance(attrs["view_query"].query, str):
+                raise TypeError(_VIEW_QUERY_SQL_MESSAGE)
+
+        new_class = super().__new__(cls, name, bases, attrs, **kwargs)
 
-        if not isinstance(attrs["view_query"].query, str):
-            raise TypeError("Provide sql query as query value in `view_query`")
+        # Register the class on the base view classes keeping a registry of
+        # subclasses, models rendered from migration states use their own app
+        # registry and aren't registered
+        if new_class._meta.apps is apps:
+            for base in new_class.__mro__[1:]:
+                registered_subclasses = base.__dict__.get("_registered_subclasses")
+                if registered_subclasses is not None:
+                    registered_subclasses.append(new_class)
 
         return new_class